@@ -0,0 +1,307 @@
+import sys
+import time
+import datetime
+import argparse
+import numpy as np
+import pymysql
+
+# Analítica de ocupación de pistas.
+# Las reservas se agregan por pista y hora en la tabla OcupacionHoraria
+# (minutos ocupados, reservas, ingresos y reservas por nivel). La tabla se
+# actualiza de forma incremental fuera de las peticiones (python analitica.py
+# actualizar --cada N) y los mapas de calor se calculan con NumPy sobre esas
+# filas en lugar de agrupar Reserva en cada consulta.
+# Los rid ya agregados se guardan en AnaliticaReservas. Como un rid se asigna al
+# hacer el INSERT pero la reserva se confirma después, cada actualización vuelve
+# a mirar las últimas VENTANA reservas por debajo de la marca de AnaliticaEstado
+# para recoger las que se confirmaron tarde.
+# El backfill construye tablas nuevas por lotes y las cambia por las actuales al
+# final, así que no bloquea las cancelaciones mientras dura.
+
+NIVELES = ['A', 'B', 'C', 'D', 'F']
+LOTE = 50000        # filas por lote al leer Reserva y escribir el rollup
+VENTANA = 10000     # rids por debajo de la marca que se vuelven a revisar
+
+SQL_UPSERT_EN = """INSERT INTO {tabla}
+        (pista, hora, minutos, reservas, ingresos, nivel_A, nivel_B, nivel_C, nivel_D, nivel_F)
+    VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s, %s)
+    ON DUPLICATE KEY UPDATE
+        minutos = minutos + VALUES(minutos),
+        reservas = reservas + VALUES(reservas),
+        ingresos = ingresos + VALUES(ingresos),
+        nivel_A = nivel_A + VALUES(nivel_A),
+        nivel_B = nivel_B + VALUES(nivel_B),
+        nivel_C = nivel_C + VALUES(nivel_C),
+        nivel_D = nivel_D + VALUES(nivel_D),
+        nivel_F = nivel_F + VALUES(nivel_F)"""
+# VALUES() en lugar del alias "AS nuevo" para que executemany agrupe las filas
+SQL_UPSERT = SQL_UPSERT_EN.format(tabla="OcupacionHoraria")
+
+
+###* Cálculo *###
+def calcularRollup(pistas, inicios, duraciones, niveles, precios):
+    '''Agrega reservas por (pista, hora).
+    pistas, duraciones (minutos) y niveles (índice en NIVELES) son arrays de enteros,
+    inicios es un array datetime64[m]. Una reserva que cruza varias horas reparte
+    sus minutos entre ellas; reservas, ingresos y nivel cuentan en la hora de inicio.
+    Devuelve un diccionario de arrays con una posición por (pista, hora).'''
+    pistas = np.asarray(pistas, dtype=np.int64)
+    inicios = np.asarray(inicios, dtype='datetime64[m]').astype(np.int64)
+    duraciones = np.asarray(duraciones, dtype=np.int64)
+    niveles = np.asarray(niveles, dtype=np.int64)
+
+    if len(pistas) == 0:
+        vacio = np.zeros(0, dtype=np.int64)
+        return {"pista": vacio, "hora": vacio.astype('datetime64[m]'), "minutos": vacio,
+                "reservas": vacio, "ingresos": np.zeros(0), "niveles": np.zeros((0, len(NIVELES)), dtype=np.int64)}
+
+    # precio de cada reserva segun su duracion (0 si no esta en la tabla)
+    tabla = np.zeros(max(max(precios), int(duraciones.max())) + 1)
+    tabla[list(precios)] = list(precios.values())
+    importes = tabla[duraciones]
+
+    # trozos de cada reserva en cada hora que toca
+    hora0 = inicios // 60
+    fines = inicios + duraciones
+    tramos = int(((inicios % 60 + duraciones + 59) // 60).max())
+    claves, minutos, primeras = [], [], []
+    for k in range(tramos):
+        hora = hora0 + k
+        solape = np.minimum(fines, (hora + 1) * 60) - np.maximum(inicios, hora * 60)
+        usadas = solape > 0 if k else np.ones(len(hora), dtype=bool)
+        claves.append((pistas[usadas] << 32) | hora[usadas])   # (pista, hora) en un entero
+        minutos.append(np.maximum(solape[usadas], 0))
+        primeras.append(np.full(usadas.sum(), k == 0))
+
+    claves = np.concatenate(claves)
+    minutos = np.concatenate(minutos)
+    primeras = np.concatenate(primeras)
+
+    unicas, inversa = np.unique(claves, return_inverse=True)
+    n = len(unicas)
+
+    resultado = {
+        "pista": unicas >> 32,
+        "hora": ((unicas & 0xFFFFFFFF) * 60).astype('datetime64[m]'),
+        "minutos": np.bincount(inversa, weights=minutos, minlength=n).astype(np.int64),
+    }
+    # la primera hora de cada reserva son las len(pistas) primeras filas
+    inicio = inversa[primeras]
+    resultado["reservas"] = np.bincount(inicio, minlength=n).astype(np.int64)
+    resultado["ingresos"] = np.round(np.bincount(inicio, weights=importes, minlength=n), 2)
+    resultado["niveles"] = np.zeros((n, len(NIVELES)), dtype=np.int64)
+    np.add.at(resultado["niveles"], (inicio, niveles), 1)
+    return resultado
+
+def filasRollup(rollup, signo=1):
+    '''Convierte el rollup en tuplas para SQL_UPSERT (signo -1 para restar).'''
+    horas = rollup["hora"].astype(datetime.datetime)
+    for i in range(len(rollup["pista"])):
+        yield (int(rollup["pista"][i]), horas[i],
+               signo * int(rollup["minutos"][i]),
+               signo * int(rollup["reservas"][i]),
+               signo * float(rollup["ingresos"][i]),
+               *(signo * int(x) for x in rollup["niveles"][i]))
+
+def rollupDeFilas(filas, precios):
+    '''Rollup a partir de filas (pista, hora_inicio, duracion, nivel_de_juego).'''
+    indice = {n: i for i, n in enumerate(NIVELES)}
+    return calcularRollup(
+        [f[0] for f in filas],
+        np.array([f[1] for f in filas], dtype='datetime64[m]'),
+        [f[2] for f in filas],
+        [indice[f[3]] for f in filas],
+        precios)
+
+def mapaCalor(pistas, filas, desde, hasta):
+    '''Agrega las filas del rollup en un mapa de ocupación por pista, día de la semana y hora.
+    filas son tuplas (pista, hora, minutos, reservas, ingresos, nivel_A..nivel_F).
+    La ocupación es la fracción de minutos ocupados sobre los minutos posibles
+    en el rango [desde, hasta] (fechas incluidas).'''
+    posicion = {pid: i for i, pid in enumerate(pistas)}
+    ocupacion = np.zeros((len(pistas), 7, 24))
+    ingresos = np.zeros(len(pistas))
+    niveles = np.zeros(len(NIVELES), dtype=np.int64)
+
+    if filas:
+        idx = np.array([posicion[f[0]] for f in filas])
+        horas = np.array([f[1] for f in filas], dtype='datetime64[h]').astype(np.int64)
+        dias = (horas // 24 + 3) % 7    # 1970-01-01 fue jueves; 0 = lunes
+        np.add.at(ocupacion, (idx, dias, horas % 24), [f[2] for f in filas])
+        np.add.at(ingresos, idx, [float(f[4]) for f in filas])
+        niveles = np.array([f[5:] for f in filas], dtype=np.int64).sum(axis=0)
+
+    # numero de veces que aparece cada dia de la semana en el rango
+    fechas = np.arange(np.datetime64(desde, 'D'), np.datetime64(hasta, 'D') + 1)
+    veces = np.bincount((fechas.astype(np.int64) + 3) % 7, minlength=7)
+    ocupacion /= np.maximum(veces, 1)[None, :, None] * 60
+
+    return {
+        "pistas": [{"pid": pid,
+                    "ocupacion": np.round(ocupacion[i], 3).tolist(),
+                    "ingresos": round(float(ingresos[i]), 2)}
+                   for i, pid in enumerate(pistas)],
+        "ingresos": round(float(ingresos.sum()), 2),
+        "niveles": dict(zip(NIVELES, niveles.tolist()))
+    }
+
+
+###* Base de datos *###
+def guardarMarca(cursor, rid):
+    cursor.execute("""INSERT INTO AnaliticaEstado (id, ultimo_rid) VALUES (1, %s)
+        ON DUPLICATE KEY UPDATE ultimo_rid = VALUES(ultimo_rid)""", (rid,))
+
+def actualizarRollup(conexion, precios, lote=LOTE, desde=None):
+    '''Agrega las reservas confirmadas que aún no están en AnaliticaReservas,
+    por lotes y con un commit por lote. Por defecto se mira desde VENTANA rids
+    por debajo de la marca; `desde` permite empezar antes (p.ej. tras importar).
+    Devuelve el número de reservas procesadas.'''
+    total = 0
+    with conexion.cursor(pymysql.cursors.Cursor) as cursor:
+        while True:
+            # la marca hace de cerrojo: una sola actualizacion a la vez
+            cursor.execute("SELECT ultimo_rid FROM AnaliticaEstado WHERE id = 1 FOR UPDATE")
+            fila = cursor.fetchone()
+            marca = fila[0] if fila else 0
+            if desde is None:
+                desde = max(marca - VENTANA, 0)
+            desde = max(desde, 0)
+
+            cursor.execute("""SELECT r.rid, r.pista, r.hora_inicio, r.duracion, r.nivel_de_juego
+                FROM Reserva r
+                LEFT JOIN AnaliticaReservas a ON a.rid = r.rid
+                WHERE r.rid > %s AND a.rid IS NULL
+                ORDER BY r.rid
+                LIMIT %s""", (desde, lote))
+            filas = cursor.fetchall()
+
+            if filas:
+                rollup = rollupDeFilas([f[1:] for f in filas], precios)
+                cursor.executemany(SQL_UPSERT, list(filasRollup(rollup)))
+                cursor.executemany("INSERT INTO AnaliticaReservas (rid) VALUES (%s)",
+                                   [(f[0],) for f in filas])
+                desde = filas[-1][0]
+                guardarMarca(cursor, max(marca, desde))
+            conexion.commit()
+
+            total += len(filas)
+            if len(filas) < lote:
+                return total
+
+def descontarReserva(cursor, rid, precios):
+    '''Resta una reserva del rollup si ya estaba agregada.
+    Se llama antes de borrarla, dentro de la misma transacción.'''
+    # esperamos a que termine cualquier actualizacion en curso
+    cursor.execute("SELECT reconstruyendo FROM AnaliticaEstado WHERE id = 1 FOR SHARE")
+    fila = cursor.fetchone()
+    reconstruyendo = fila and (fila['reconstruyendo'] if isinstance(fila, dict) else fila[0])
+    if reconstruyendo:  # el backfill la restara de las tablas nuevas al terminar
+        cursor.execute("""INSERT INTO AnaliticaBorradas (rid, pista, hora_inicio, duracion, nivel_de_juego)
+            SELECT rid, pista, hora_inicio, duracion, nivel_de_juego FROM Reserva WHERE rid = %s""", (rid,))
+
+    # lectura con bloqueo para ver lo ultimo confirmado, no la instantanea de la transaccion
+    cursor.execute("SELECT rid FROM AnaliticaReservas WHERE rid = %s FOR UPDATE", (rid,))
+    if not cursor.fetchone():
+        return
+
+    cursor.execute("""SELECT pista, hora_inicio, duracion, nivel_de_juego
+        FROM Reserva WHERE rid = %s""", (rid,))
+    fila = cursor.fetchone()
+    if isinstance(fila, dict):  # la app usa DictCursor
+        fila = (fila['pista'], fila['hora_inicio'], fila['duracion'], fila['nivel_de_juego'])
+    cursor.executemany(SQL_UPSERT, list(filasRollup(rollupDeFilas([fila], precios), -1)))
+    cursor.execute("DELETE FROM AnaliticaReservas WHERE rid = %s", (rid,))
+
+def backfill(conectar, precios, lote=LOTE):
+    '''Reconstruye OcupacionHoraria y AnaliticaReservas desde cero.
+    Se construyen OcupacionHorariaNueva y AnaliticaReservasNueva leyendo Reserva con
+    un cursor sin buffer y un commit por lote, y se cambian por las actuales con
+    RENAME TABLE. Las cancelaciones de mientras se apuntan en AnaliticaBorradas y
+    se restan después. No lanzar dos a la vez; si se interrumpe, volver a lanzarlo.
+    Devuelve el número de reservas procesadas.'''
+    total = 0
+    with conectar() as escritura, conectar() as lectura:
+        with escritura.cursor(pymysql.cursors.Cursor) as cursor:
+            cursor.execute("DROP TABLE IF EXISTS OcupacionHorariaNueva, AnaliticaReservasNueva")
+            cursor.execute("CREATE TABLE OcupacionHorariaNueva LIKE OcupacionHoraria")
+            cursor.execute("CREATE TABLE AnaliticaReservasNueva LIKE AnaliticaReservas")
+
+            # a partir de aqui las cancelaciones se apuntan en AnaliticaBorradas
+            cursor.execute("SELECT ultimo_rid FROM AnaliticaEstado WHERE id = 1 FOR UPDATE")
+            cursor.execute("UPDATE AnaliticaEstado SET reconstruyendo = 1 WHERE id = 1")
+            cursor.execute("DELETE FROM AnaliticaBorradas")
+            escritura.commit()
+
+            # la lectura ve una foto fija de Reserva tomada despues de activar el apunte
+            with lectura.cursor(pymysql.cursors.SSCursor) as origen:
+                origen.execute("START TRANSACTION WITH CONSISTENT SNAPSHOT")
+                origen.execute("SELECT COALESCE(MAX(rid), 0) FROM Reserva")
+                marca = origen.fetchone()[0]
+                origen.execute("""SELECT rid, pista, hora_inicio, duracion, nivel_de_juego
+                    FROM Reserva""")
+                sql = SQL_UPSERT_EN.format(tabla="OcupacionHorariaNueva")
+                while True:
+                    filas = origen.fetchmany(lote)
+                    if not filas:
+                        break
+                    rollup = rollupDeFilas([f[1:] for f in filas], precios)
+                    cursor.executemany(sql, list(filasRollup(rollup)))
+                    cursor.executemany("INSERT INTO AnaliticaReservasNueva (rid) VALUES (%s)",
+                                       [(f[0],) for f in filas])
+                    escritura.commit()
+                    total += len(filas)
+            lectura.commit()
+
+            cursor.execute("""RENAME TABLE
+                OcupacionHoraria TO OcupacionHorariaVieja,
+                OcupacionHorariaNueva TO OcupacionHoraria,
+                AnaliticaReservas TO AnaliticaReservasVieja,
+                AnaliticaReservasNueva TO AnaliticaReservas""")
+
+            # restamos las canceladas durante la reconstruccion que siguen contadas
+            cursor.execute("SELECT ultimo_rid FROM AnaliticaEstado WHERE id = 1 FOR UPDATE")
+            cursor.execute("""SELECT b.rid, b.pista, b.hora_inicio, b.duracion, b.nivel_de_juego
+                FROM AnaliticaBorradas b
+                JOIN AnaliticaReservas a ON a.rid = b.rid""")
+            borradas = cursor.fetchall()
+            if borradas:
+                rollup = rollupDeFilas([f[1:] for f in borradas], precios)
+                cursor.executemany(SQL_UPSERT, list(filasRollup(rollup, -1)))
+                cursor.executemany("DELETE FROM AnaliticaReservas WHERE rid = %s",
+                                   [(f[0],) for f in borradas])
+            # las confirmadas despues de la foto las recoge actualizar desde la marca
+            cursor.execute("""UPDATE AnaliticaEstado SET reconstruyendo = 0, ultimo_rid = %s
+                WHERE id = 1""", (marca,))
+            cursor.execute("DELETE FROM AnaliticaBorradas")
+            escritura.commit()
+
+            cursor.execute("DROP TABLE OcupacionHorariaVieja, AnaliticaReservasVieja")
+    return total
+
+
+###* Línea de comandos *###
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Mantenimiento de la analítica de ocupación")
+    parser.add_argument("accion", choices=["backfill", "actualizar"],
+                        help="backfill reconstruye el rollup; actualizar agrega las reservas nuevas")
+    parser.add_argument("--cada", type=int, default=0, metavar="SEGUNDOS",
+                        help="con actualizar, repetir cada SEGUNDOS en lugar de salir")
+    args = parser.parse_args(argv)
+
+    from app import conectarBD, precios
+    while True:
+        inicio = datetime.datetime.now()
+        if args.accion == "backfill":
+            total = backfill(conectarBD, precios)
+        else:
+            with conectarBD() as conexion:
+                total = actualizarRollup(conexion, precios)
+        segundos = (datetime.datetime.now() - inicio).total_seconds()
+        print(f"{total} reservas agregadas en {segundos:.1f} s", flush=True)
+
+        if args.accion == "backfill" or args.cada <= 0:
+            return 0
+        time.sleep(args.cada)
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -6,6 +6,9 @@ import flask
 from flask_cors import CORS
 import jwt
 import bcrypt
+import limitador
+import analitica
+import perfilador
 
 # Cargar variables de entorno de la BD
 DB_NAME = os.getenv("MYSQL_DATABASE")
@@ -29,16 +32,29 @@ mapa = {    # define los niveles de juego permitidos
     'F': ['D', 'F']
     }
 
+limites = { # endpoint: (capacidad, tokens por segundo, clave) -> ver limitador.py
+    'end_login': (5, 5 / 60, 'ip'),             # bcrypt: 5 intentos por minuto
+    'end_registro': (3, 3 / 60, 'ip'),          # bcrypt al registrar
+    'end_obtenerEmpresa': (20, 1, 'ip'),        # una consulta por pista con ?fecha=
+    'end_reservar': (10, 10 / 60, 'usuario'),
+    'end_enviar_peticion': (10, 10 / 60, 'usuario'),
+    'end_aceptar_peticion': (10, 10 / 60, 'usuario'),
+    'end_analitica': (10, 10 / 60, 'ip')
+    }
+
 # Configurar Flask
 app = flask.Flask(__name__)
 CORS(app)
 app.json.ensure_ascii = False
+limitador.instalar(app, limites, HASH_KEY)
+perfilador.instalar(app)
 
 
 ###* Funciones *###
-def conectarBD():
+def conectarBD(**opciones):
     '''Crea y devuelve una conexión a la base de datos.
-        Se cierra al salir del contexto with'''
+        Se cierra al salir del contexto with.
+        Las opciones extra se pasan a pymysql (p.ej. local_infile=True)'''
     return pymysql.connect(
         database=DB_NAME,
         user=DB_USER,
@@ -46,7 +62,8 @@ def conectarBD():
         host=DB_HOST,
         port=DB_PORT,
         charset="utf8mb4",
-        cursorclass=pymysql.cursors.DictCursor
+        cursorclass=pymysql.cursors.DictCursor,
+        **opciones
     )
 
 def normalizarHoras(filas):
@@ -652,6 +669,46 @@ def end_obtenerEmpresas():
     
     return flask.jsonify(empresas)
 
+@app.route('/analitica/<string:nombre>', methods=['GET'])
+def end_analitica(nombre):
+    """Ocupación por pista, día de la semana y hora, ingresos y niveles de una empresa"""
+    hasta = flask.request.args.get('hasta') or datetime.date.today().isoformat()  # YYYY-MM-DD
+    desde = flask.request.args.get('desde')
+    try:
+        hasta = datetime.date.fromisoformat(hasta)
+        desde = datetime.date.fromisoformat(desde) if desde else hasta - timedelta(days=29)
+    except ValueError:
+        return {"error": "Fecha no válida (YYYY-MM-DD)"}, 400
+
+    if desde > hasta:
+        return {"error": "La fecha desde es posterior a hasta"}, 400
+
+    try:
+        with conectarBD() as conexion:  # el rollup lo actualiza el servicio analitica
+            with conexion.cursor(pymysql.cursors.Cursor) as cursor:
+                cursor.execute("""SELECT p.pid FROM Pistas p
+                    JOIN Empresas e ON p.empresa = e.eid
+                    WHERE e.nombre = %s ORDER BY p.pid""", (nombre,))
+                pistas = [fila[0] for fila in cursor.fetchall()]
+
+                if not pistas:
+                    return {"error": "Empresa no encontrada o sin pistas"}, 404
+
+                cursor.execute("""SELECT o.pista, o.hora, o.minutos, o.reservas, o.ingresos,
+                        o.nivel_A, o.nivel_B, o.nivel_C, o.nivel_D, o.nivel_F
+                    FROM OcupacionHoraria o
+                    JOIN Pistas p ON o.pista = p.pid
+                    JOIN Empresas e ON p.empresa = e.eid
+                    WHERE e.nombre = %s AND o.hora >= %s AND o.hora < %s""",
+                    (nombre, desde, hasta + timedelta(days=1)))
+                filas = cursor.fetchall()
+    except Exception as e:
+        return {"error": str(e)}, 500
+
+    resultado = analitica.mapaCalor(pistas, filas, desde, hasta)
+    resultado.update({"empresa": nombre, "desde": desde.isoformat(), "hasta": hasta.isoformat()})
+    return flask.jsonify(resultado)
+
 @app.route('/eliminar_reserva', methods=['DELETE'])
 def end_eliminar_reserva():
     """Elimina una reserva y devuelve el dinero al monedero del usuario"""
@@ -707,6 +764,7 @@ def end_eliminar_reserva():
                 
                 # Si no quedan participantes, eliminar la reserva
                 if count == 0:
+                    analitica.descontarReserva(cursor, rid, precios) # la quitamos del rollup
                     cursor.execute("DELETE FROM Reserva WHERE rid = %s", (rid,))
                 else:
                     # Si quedan participantes y es tipo Libre, incrementar huecos libres
@@ -0,0 +1,46 @@
+'''Mide el cálculo del rollup horario y del mapa de calor con reservas sintéticas.
+Uso: python benchmarks/bench_analitica.py [n_reservas] (desde backend/)'''
+import os
+import sys
+import time
+import datetime
+import numpy as np
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+import analitica
+
+precios = {60: 3.75, 90: 5.63, 120: 7.5}
+N = int(sys.argv[1]) if len(sys.argv) > 1 else 1_200_000
+PISTAS = 200
+
+
+def reservasSinteticas(n, semilla=20):
+    '''Reservas repartidas en dos años entre las 8:00 y las 22:00, en medias horas.'''
+    rng = np.random.default_rng(semilla)
+    dias = rng.integers(0, 730, n)
+    medias = rng.integers(16, 44, n)
+    inicios = np.datetime64('2024-01-01T00:00') + (dias * 1440 + medias * 30).astype('timedelta64[m]')
+    return (rng.integers(1, PISTAS + 1, n), inicios,
+            rng.choice([60, 90, 120], n), rng.integers(0, len(analitica.NIVELES), n))
+
+
+if __name__ == '__main__':
+    pistas, inicios, duraciones, niveles = reservasSinteticas(N)
+
+    inicio = time.perf_counter()
+    rollup = analitica.calcularRollup(pistas, inicios, duraciones, niveles, precios)
+    t = time.perf_counter() - inicio
+    print(f"rollup: {N} reservas -> {len(rollup['pista'])} filas en {t:.2f} s ({N / t:,.0f} reservas/s)")
+
+    # mapa de calor de un club de 10 pistas durante un año
+    club = list(range(1, 11))
+    mascara = np.isin(rollup["pista"], club) & (rollup["hora"] >= np.datetime64('2025-01-01'))
+    filas = [(int(rollup["pista"][i]), rollup["hora"][i].astype(datetime.datetime),
+              int(rollup["minutos"][i]), int(rollup["reservas"][i]), float(rollup["ingresos"][i]),
+              *rollup["niveles"][i].tolist()) for i in np.flatnonzero(mascara)]
+
+    inicio = time.perf_counter()
+    mapa = analitica.mapaCalor(club, filas, datetime.date(2025, 1, 1), datetime.date(2025, 12, 31))
+    t = time.perf_counter() - inicio
+    print(f"mapa de calor: {len(filas)} filas de rollup en {t * 1000:.1f} ms "
+          f"(ingresos {mapa['ingresos']} €)")
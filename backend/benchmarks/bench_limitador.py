@@ -0,0 +1,69 @@
+'''Mide el coste por petición del limitador.
+Uso: python benchmarks/bench_limitador.py (desde backend/)'''
+import os
+import sys
+import time
+import flask
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+import limitador
+
+N = 20000           # llamadas por repetición
+REPETICIONES = 5    # nos quedamos con la mejor para quitar ruido
+
+
+def medir(funcion, n=N, repeticiones=REPETICIONES):
+    '''Devuelve los microsegundos por llamada de la mejor repetición,
+    tras un calentamiento.'''
+    for _ in range(n // 10):
+        funcion()
+    mejor = float("inf")
+    for _ in range(repeticiones):
+        inicio = time.perf_counter()
+        for _ in range(n):
+            funcion()
+        mejor = min(mejor, time.perf_counter() - inicio)
+    return mejor / n * 1e6
+
+def crearApp(limites):
+    app = flask.Flask(__name__)
+    if limites is not None:
+        limitador.instalar(app, limites, b"clave", limitador.AlmacenMemoria())
+
+    @app.route('/ping', methods=['POST'])
+    def ping():
+        return {"ok": True}, 200
+    return app
+
+
+if __name__ == '__main__':
+    almacen = limitador.AlmacenMemoria()
+    us = medir(lambda: almacen.consumir("ip:127.0.0.1", 10**9, 10**9))
+    print(f"AlmacenMemoria.consumir:       {us:8.2f} us/op")
+
+    clientes = [
+        ("sin limitador", crearApp(None)),
+        ("ruta sin limite", crearApp({})),
+        ("limite por ip", crearApp({'ping': (10**9, 10**9, 'ip')})),
+        ("limite por usuario", crearApp({'ping': (10**9, 10**9, 'usuario')})),
+    ]
+    # coste de los hooks before_request: es lo que añade el limitador a cada peticion
+    for nombre, app in clientes:
+        with app.test_request_context('/ping', method='POST', json={"udni": "12345678A"}):
+            us = medir(app.preprocess_request)
+        print(f"hooks, {nombre:<23} {us:8.2f} us/peticion")
+
+    # peticion completa con el cliente de pruebas; las repeticiones se intercalan
+    # entre apps para que el ruido afecte a todas por igual
+    tiempos = [float("inf")] * len(clientes)
+    pruebas = [app.test_client() for _, app in clientes]
+    for cliente in pruebas:     # calentamiento
+        for _ in range(200):
+            cliente.post('/ping', json={"udni": "12345678A"})
+    for _ in range(REPETICIONES):
+        for i, cliente in enumerate(pruebas):
+            tiempos[i] = min(tiempos[i], medir(lambda: cliente.post('/ping', json={"udni": "12345678A"}), N // 10, 1))
+
+    base = tiempos[0]   # todas se comparan con la app sin limitador
+    for (nombre, _), us in zip(clientes, tiempos):
+        print(f"completa, {nombre:<20} {us:8.2f} us/peticion  ({us - base:+.2f})")
@@ -0,0 +1,262 @@
+import os
+import sys
+import csv
+import json
+import time
+import argparse
+import pymysql
+import analitica
+
+# Importación y exportación masiva de empresas, pistas y reservas en CSV o NDJSON.
+# Se lee y escribe por lotes para que la memoria no crezca con el tamaño del fichero:
+#   python datos.py importar reservas reservas.csv [--rapido] [--infile]
+#   python datos.py exportar reservas -o reservas.ndjson --formato ndjson
+# Al importar reservas se agregan después a la analítica solo las importadas
+# (analitica.actualizarRollup desde el rid más bajo del fichero o desde el máximo
+# que había antes). Con --sin-analitica se omite; "python analitica.py backfill"
+# sigue disponible para reconstruirla entera a mano.
+
+LOTE = 10000        # filas por executemany / fetchmany
+
+tablas = {  # nombre en la CLI: (tabla, columnas permitidas)
+    'empresas': ('Empresas', ['eid', 'nombre', 'direccion', 'hora_apertura', 'hora_cierre']),
+    'pistas': ('Pistas', ['pid', 'empresa', 'tipo', 'indoor']),
+    'reservas': ('Reserva', ['rid', 'pista', 'hora_inicio', 'duracion', 'nivel_de_juego',
+                             'tipo', 'huecos_libres', 'estado'])
+    }
+
+
+###* Funciones *###
+def formatoDe(ruta, formato):
+    '''Formato indicado o deducido de la extensión (csv por defecto).'''
+    if formato:
+        return formato
+    return 'ndjson' if ruta and ruta.endswith(('.ndjson', '.jsonl')) else 'csv'
+
+def leerFilas(fichero, formato):
+    '''Devuelve (columnas, iterador de filas como diccionarios) sin cargar el fichero.
+    En NDJSON todas las líneas deben tener las mismas claves que la primera.'''
+    if formato == 'csv':
+        lector = csv.DictReader(fichero)
+        return lector.fieldnames or [], lector
+
+    primera = fichero.readline()
+    if not primera.strip():
+        return [], iter([])
+    primera = json.loads(primera)
+
+    columnas = list(primera)
+
+    def filas():
+        yield primera
+        for numero, linea in enumerate(fichero, start=2):
+            if not linea.strip():
+                continue
+            fila = json.loads(linea)
+            if fila.keys() != primera.keys():
+                raise SystemExit(f"Línea {numero}: las claves {', '.join(sorted(fila))} "
+                                 f"no coinciden con las de la primera línea ({', '.join(columnas)})")
+            yield fila
+    return columnas, filas()
+
+def comprobarColumnas(nombre, columnas):
+    _, permitidas = tablas[nombre]
+    desconocidas = [c for c in columnas if c not in permitidas]
+    if desconocidas:
+        raise SystemExit(f"Columnas no válidas para {nombre}: {', '.join(desconocidas)}")
+    if not columnas:
+        raise SystemExit("El fichero no tiene cabecera o está vacío")
+
+def informar(filas, inicio, final=False):
+    segundos = max(time.perf_counter() - inicio, 1e-9)
+    print(f"{filas} filas en {segundos:.1f} s ({filas / segundos:,.0f} filas/s)",
+          file=sys.stderr, end="\n" if final else "\r")
+
+def idMinimo(minimo, valor):
+    '''Actualiza el id explícito más bajo visto (los vacíos son autoincrementales).'''
+    if valor in (None, ''):
+        return minimo
+    return int(valor) if minimo is None else min(minimo, int(valor))
+
+def importar(conexion, nombre, fichero, formato, rapido=False, lote=LOTE):
+    '''Inserta las filas por lotes con executemany, con un commit por lote.
+    Con rapido se desactivan unique_checks y foreign_key_checks durante la carga.
+    Devuelve (filas importadas, id explícito más bajo o None).'''
+    tabla, permitidas = tablas[nombre]
+    columnas, filas = leerFilas(fichero, formato)
+    comprobarColumnas(nombre, columnas)
+    clave = permitidas[0] if permitidas[0] in columnas else None
+    minimo = None
+
+    sql = (f"INSERT INTO {tabla} ({', '.join(columnas)}) "
+           f"VALUES ({', '.join(['%s'] * len(columnas))})")
+    total = 0
+    inicio = time.perf_counter()
+    with conexion.cursor() as cursor:
+        if rapido:
+            cursor.execute("SET unique_checks = 0, foreign_key_checks = 0")
+        try:
+            bloque = []
+            for fila in filas:
+                if clave:
+                    minimo = idMinimo(minimo, fila.get(clave))
+                # en CSV los vacios son NULL (p.ej. ids autoincrementales)
+                bloque.append([None if fila.get(c) == '' else fila.get(c) for c in columnas])
+                if len(bloque) >= lote:
+                    cursor.executemany(sql, bloque)
+                    conexion.commit()
+                    total += len(bloque)
+                    bloque = []
+                    informar(total, inicio)
+            if bloque:
+                cursor.executemany(sql, bloque)
+                conexion.commit()
+                total += len(bloque)
+        finally:
+            if rapido:
+                cursor.execute("SET unique_checks = 1, foreign_key_checks = 1")
+    informar(total, inicio, final=True)
+    return total, minimo
+
+def importarInfile(conexion, nombre, ruta, rapido=False):
+    '''Carga un CSV con LOAD DATA LOCAL INFILE (el servidor necesita local_infile=ON).
+    Las líneas deben acabar en \\n y las comillas se escapan duplicándolas,
+    como en los ficheros que genera exportar. Si MySQL da avisos (duplicados,
+    conversiones) se deshace la carga, porque serían filas perdidas o truncadas.
+    Devuelve (filas importadas, id explícito más bajo o None).'''
+    tabla, permitidas = tablas[nombre]
+    minimo = None
+    with open(ruta, newline='', encoding='utf-8') as fichero:
+        columnas, filas = leerFilas(fichero, 'csv')
+        comprobarColumnas(nombre, columnas)
+        if permitidas[0] in columnas:   # recorremos el fichero para saber desde que id se importa
+            for fila in filas:
+                minimo = idMinimo(minimo, fila.get(permitidas[0]))
+
+    inicio = time.perf_counter()
+    with conexion.cursor() as cursor:
+        if rapido:
+            cursor.execute("SET unique_checks = 0, foreign_key_checks = 0")
+        try:
+            # en LOAD DATA el vacio es '' y no NULL, asi que lo convertimos con NULLIF
+            variables = ', '.join(f"@{c}" for c in columnas)
+            asignaciones = ', '.join(f"{c} = NULLIF(@{c}, '')" for c in columnas)
+            cursor.execute(f"""LOAD DATA LOCAL INFILE %s INTO TABLE {tabla}
+                CHARACTER SET utf8mb4
+                FIELDS TERMINATED BY ',' OPTIONALLY ENCLOSED BY '"' ESCAPED BY ''
+                LINES TERMINATED BY '\\n'
+                IGNORE 1 LINES ({variables})
+                SET {asignaciones}""", (ruta,))
+            total = cursor.rowcount
+
+            cursor.execute("SHOW COUNT(*) WARNINGS")
+            avisos = cursor.fetchone()
+            avisos = list(avisos.values())[0] if isinstance(avisos, dict) else avisos[0]
+            if avisos:
+                cursor.execute("SHOW WARNINGS LIMIT 10")
+                detalle = "\n".join(f"  {a['Level']} {a['Code']}: {a['Message']}" if isinstance(a, dict)
+                                    else f"  {a[0]} {a[1]}: {a[2]}" for a in cursor.fetchall())
+                conexion.rollback()
+                raise SystemExit(f"LOAD DATA dio {avisos} avisos, carga deshecha:\n{detalle}")
+            conexion.commit()
+        finally:
+            if rapido:
+                cursor.execute("SET unique_checks = 1, foreign_key_checks = 1")
+    informar(total, inicio, final=True)
+    return total, minimo
+
+def exportar(conexion, nombre, fichero, formato, lote=LOTE):
+    '''Escribe la tabla leyendo con un cursor sin buffer (SSCursor),
+    de modo que solo hay un lote en memoria.'''
+    tabla, columnas = tablas[nombre]
+    total = 0
+    inicio = time.perf_counter()
+    if formato == 'csv':
+        escritor = csv.writer(fichero, lineterminator='\n')
+        escritor.writerow(columnas)
+
+    with conexion.cursor(pymysql.cursors.SSCursor) as cursor:
+        cursor.execute(f"SELECT {', '.join(columnas)} FROM {tabla} ORDER BY {columnas[0]}")
+        while True:
+            filas = cursor.fetchmany(lote)
+            if not filas:
+                break
+            if formato == 'csv':    # horas, fechas y decimales se escriben con str()
+                escritor.writerows(filas)
+            else:
+                for fila in filas:
+                    fichero.write(json.dumps(dict(zip(columnas, fila)), ensure_ascii=False, default=str) + "\n")
+            total += len(filas)
+            informar(total, inicio)
+    informar(total, inicio, final=True)
+    return total
+
+
+###* Línea de comandos *###
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Importa y exporta empresas, pistas y reservas")
+    acciones = parser.add_subparsers(dest="accion", required=True)
+
+    imp = acciones.add_parser("importar", help="carga un fichero CSV o NDJSON")
+    imp.add_argument("tabla", choices=tablas)
+    imp.add_argument("fichero", help="ruta del fichero, o - para la entrada estándar")
+    imp.add_argument("--formato", choices=["csv", "ndjson"])
+    imp.add_argument("--lote", type=int, default=LOTE)
+    imp.add_argument("--rapido", action="store_true",
+                     help="desactiva unique_checks y foreign_key_checks durante la carga")
+    imp.add_argument("--infile", action="store_true",
+                     help="usa LOAD DATA LOCAL INFILE (solo CSV desde fichero)")
+    imp.add_argument("--sin-analitica", action="store_true",
+                     help="no agregar a la analítica las reservas importadas")
+
+    exp = acciones.add_parser("exportar", help="vuelca una tabla a CSV o NDJSON")
+    exp.add_argument("tabla", choices=tablas)
+    exp.add_argument("-o", "--salida", help="fichero de salida (por defecto la salida estándar)")
+    exp.add_argument("--formato", choices=["csv", "ndjson"])
+    exp.add_argument("--lote", type=int, default=LOTE)
+
+    args = parser.parse_args(argv)
+    from app import conectarBD, precios
+
+    if args.accion == "importar":
+        formato = formatoDe(args.fichero, args.formato)
+        analizar = args.tabla == 'reservas' and not args.sin_analitica
+        if analizar:    # las importadas sin rid explicito quedaran por encima de este
+            with conectarBD() as conexion:
+                with conexion.cursor() as cursor:
+                    cursor.execute("SELECT COALESCE(MAX(rid), 0) AS maximo FROM Reserva")
+                    maximo = cursor.fetchone()['maximo']
+
+        if args.infile:
+            if formato != 'csv' or args.fichero == '-':
+                raise SystemExit("--infile solo admite un fichero CSV")
+            with conectarBD(local_infile=True) as conexion:
+                _, minimo = importarInfile(conexion, args.tabla, os.path.abspath(args.fichero), args.rapido)
+        else:
+            with conectarBD() as conexion:
+                if args.fichero == '-':
+                    _, minimo = importar(conexion, args.tabla, sys.stdin, formato, args.rapido, args.lote)
+                else:
+                    with open(args.fichero, newline='', encoding='utf-8') as fichero:
+                        _, minimo = importar(conexion, args.tabla, fichero, formato, args.rapido, args.lote)
+
+        if analizar:
+            desde = maximo if minimo is None else min(maximo, minimo - 1)
+            inicio = time.perf_counter()
+            with conectarBD() as conexion:
+                total = analitica.actualizarRollup(conexion, precios, desde=desde)
+            print(f"analítica: {total} reservas agregadas en {time.perf_counter() - inicio:.1f} s",
+                  file=sys.stderr)
+        return 0
+
+    formato = formatoDe(args.salida, args.formato)
+    with conectarBD() as conexion:
+        if args.salida:
+            with open(args.salida, "w", newline='', encoding='utf-8') as fichero:
+                exportar(conexion, args.tabla, fichero, formato, args.lote)
+        else:
+            exportar(conexion, args.tabla, sys.stdout, formato, args.lote)
+    return 0
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,150 @@
+import os
+import math
+import time
+import threading
+import collections
+import flask
+import jwt
+from werkzeug.middleware.proxy_fix import ProxyFix
+
+# Limitador de peticiones por cubeta de tokens (token bucket).
+# Cada clave (udni del JWT o IP) tiene una cubeta con `capacidad`
+# tokens que se recarga a `recarga` tokens por segundo. Cada petición
+# consume un token; si no quedan se responde 429 con Retry-After.
+
+MAX_CLAVES = 100000     # limite de cubetas en memoria; se descartan las menos usadas
+LIMITE_PROXIES = int(os.getenv("LIMITE_PROXIES") or 0) # proxies de confianza delante del backend
+
+
+###* Almacenes *###
+class AlmacenMemoria:
+    '''Guarda las cubetas en memoria del proceso.
+    Vale para un solo worker; con varios usar un almacén compartido.'''
+
+    def __init__(self, max_claves=MAX_CLAVES):
+        self.cubetas = collections.OrderedDict()   # clave -> [tokens, ultimo instante], de menos a más reciente
+        self.max_claves = max_claves
+        self.cerrojo = threading.Lock()
+
+    def consumir(self, clave, capacidad, recarga):
+        '''Consume un token de la cubeta. Devuelve los segundos a esperar
+        (0 si la petición se admite).'''
+        ahora = time.monotonic()
+        with self.cerrojo:
+            cubeta = self.cubetas.get(clave)
+            if cubeta is None:
+                while len(self.cubetas) >= self.max_claves:
+                    self.cubetas.popitem(last=False)    # descartamos la usada hace más tiempo
+                self.cubetas[clave] = [capacidad - 1, ahora]
+                return 0
+
+            self.cubetas.move_to_end(clave)     # la marcamos como la más reciente
+            tokens = min(capacidad, cubeta[0] + (ahora - cubeta[1]) * recarga)
+            cubeta[1] = ahora
+            if tokens >= 1:
+                cubeta[0] = tokens - 1
+                return 0
+
+            cubeta[0] = tokens
+            return (1 - tokens) / recarga
+
+
+class AlmacenRedis:
+    '''Guarda las cubetas en Redis para compartirlas entre workers.
+    La actualización se hace en un script Lua para que sea atómica.'''
+
+    SCRIPT = """
+        local cubeta = redis.call('HMGET', KEYS[1], 'tokens', 'ultimo')
+        local capacidad = tonumber(ARGV[1])
+        local recarga = tonumber(ARGV[2])
+        local t = redis.call('TIME')
+        local ahora = tonumber(t[1]) + tonumber(t[2]) / 1000000
+        local tokens = capacidad
+        if cubeta[1] then
+            tokens = math.min(capacidad, tonumber(cubeta[1]) + (ahora - tonumber(cubeta[2])) * recarga)
+        end
+        local espera = 0
+        if tokens >= 1 then
+            tokens = tokens - 1
+        else
+            espera = (1 - tokens) / recarga
+        end
+        redis.call('HSET', KEYS[1], 'tokens', tokens, 'ultimo', ahora)
+        redis.call('EXPIRE', KEYS[1], math.ceil(capacidad / recarga) + 1)
+        return tostring(espera)
+    """
+
+    def __init__(self, url, prefijo="limite:"):
+        try:
+            import redis    # solo se necesita si se usa este almacén
+        except ImportError:
+            raise RuntimeError("LIMITE_REDIS_URL necesita el paquete redis (pip install redis)")
+        self.cliente = redis.Redis.from_url(url)
+        self.script = self.cliente.register_script(self.SCRIPT)
+        self.prefijo = prefijo
+
+    def consumir(self, clave, capacidad, recarga):
+        return float(self.script(keys=[self.prefijo + clave], args=[capacidad, recarga]))
+
+
+def crearAlmacen():
+    '''Devuelve el almacén según el entorno: Redis si hay LIMITE_REDIS_URL,
+    memoria en otro caso.'''
+    url = os.getenv("LIMITE_REDIS_URL")
+    if url:
+        return AlmacenRedis(url)
+    return AlmacenMemoria()
+
+
+###* Claves *###
+def claveIP():
+    '''IP del cliente. X-Forwarded-For solo se tiene en cuenta si hay
+    LIMITE_PROXIES configurados (lo aplica ProxyFix en instalar).'''
+    return flask.request.remote_addr or "desconocida"
+
+def claveUsuario(hash_key):
+    '''udni del token JWT; si no hay token válido, la IP.
+    El udni del cuerpo no se usa porque el cliente puede cambiarlo en cada petición.'''
+    cabecera = flask.request.headers.get("Authorization", "")
+    if cabecera.startswith("Bearer "):
+        try:
+            payload = jwt.decode(cabecera[7:], hash_key, algorithms=['HS256'])
+            if payload.get("udni"):
+                return "udni:" + payload["udni"]
+        except jwt.PyJWTError:
+            pass
+    return "ip:" + claveIP()
+
+
+###* Integración con Flask *###
+def instalar(app, limites, hash_key=None, almacen=None, proxies=None):
+    '''Registra el limitador en la app.
+    `limites` asocia el nombre del endpoint a (capacidad, recarga por segundo, clave),
+    donde clave es 'ip' o 'usuario'. Los endpoints sin entrada no se limitan.
+    Con `proxies` > 0 se confía en ese número de saltos de X-Forwarded-For.'''
+    almacen = almacen or crearAlmacen()
+    proxies = LIMITE_PROXIES if proxies is None else proxies
+    if proxies > 0:
+        app.wsgi_app = ProxyFix(app.wsgi_app, x_for=proxies)
+
+    @app.before_request
+    def comprobarLimite():
+        limite = limites.get(flask.request.endpoint)
+        if limite is None or flask.request.method == 'OPTIONS':  # sin limite o preflight CORS
+            return None
+
+        capacidad, recarga, tipo = limite
+        if tipo == 'ip':
+            clave = "ip:" + claveIP()
+        else:
+            clave = claveUsuario(hash_key)
+
+        espera = almacen.consumir(flask.request.endpoint + ":" + clave, capacidad, recarga)
+        if espera > 0:
+            respuesta = flask.jsonify({"error": "Demasiadas peticiones, inténtalo más tarde"})
+            respuesta.status_code = 429
+            respuesta.headers["Retry-After"] = str(math.ceil(espera))
+            return respuesta
+        return None
+
+    return almacen
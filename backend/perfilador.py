@@ -0,0 +1,147 @@
+import os
+import io
+import hmac
+import time
+import random
+import marshal
+import cProfile
+import datetime
+import itertools
+import threading
+import collections
+import flask
+
+# Perfilado bajo demanda de peticiones con cProfile.
+# Se activa para una petición con la cabecera X-Perfil: <PERFIL_TOKEN>, o para
+# una fracción PERFIL_MUESTREO (0..1) de todas. Los últimos PERFIL_MAXIMO perfiles
+# se guardan en memoria y se descargan desde /admin/perfiles con el mismo token.
+# Sin PERFIL_TOKEN no se registra nada (tampoco el muestreo, porque los perfiles
+# no se podrían descargar), así que no añade coste.
+
+PERFIL_TOKEN = os.getenv("PERFIL_TOKEN")
+PERFIL_MUESTREO = float(os.getenv("PERFIL_MUESTREO") or 0)
+PERFIL_MAXIMO = int(os.getenv("PERFIL_MAXIMO") or 20)
+
+
+###* Funciones *###
+def tokenValido(valor):
+    '''Comprueba el token sin revelar por tiempo cuánto coincide.'''
+    return bool(PERFIL_TOKEN) and hmac.compare_digest((valor or "").encode(), PERFIL_TOKEN.encode())
+
+def pilasColapsadas(stats):
+    '''Convierte las estadísticas de cProfile en pilas colapsadas
+    ("a;b;c microsegundos" por línea) para flamegraph.pl o speedscope.
+    cProfile solo guarda llamador -> llamado, así que el tiempo de cada función
+    se reparte entre sus llamadores en proporción a lo que gastó con cada uno.'''
+    def nombre(func):
+        fichero, linea, funcion = func
+        return f"{funcion} ({os.path.basename(fichero)}:{linea})"
+
+    llamados = collections.defaultdict(list)
+    for func, (_, _, _, _, llamadores) in stats.items():
+        for llamador, (_, _, _, ct) in llamadores.items():
+            llamados[llamador].append((func, ct))
+
+    lineas = collections.Counter()
+
+    def recorrer(func, pila, tiempo):
+        total = stats[func][3]
+        if total <= 0 or tiempo <= 0:
+            return
+        escala = tiempo / total
+        pila = pila + [nombre(func)]
+        lineas[";".join(pila)] += stats[func][2] * escala
+        for hijo, ct in llamados[func]:
+            if nombre(hijo) not in pila and len(pila) < 100:   # evitamos ciclos
+                recorrer(hijo, pila, ct * escala)
+
+    for func, (_, _, _, ct, llamadores) in stats.items():
+        if not llamadores:  # raices
+            recorrer(func, [], ct)
+
+    salida = io.StringIO()
+    for pila, segundos in lineas.items():
+        microsegundos = round(segundos * 1e6)
+        if microsegundos > 0:
+            salida.write(f"{pila} {microsegundos}\n")
+    return salida.getvalue()
+
+
+###* Integración con Flask *###
+def instalar(app):
+    '''Registra el perfilado y los endpoints de administración si está configurado.'''
+    if not PERFIL_TOKEN:
+        if PERFIL_MUESTREO > 0:
+            print("PERFIL_MUESTREO se ignora: hace falta PERFIL_TOKEN para descargar los perfiles")
+        return None
+
+    perfiles = collections.deque(maxlen=PERFIL_MAXIMO)   # buffer circular
+    cerrojo = threading.Lock()
+    contador = itertools.count(1)
+
+    @app.before_request
+    def empezarPerfil():
+        pedido = flask.request.headers.get("X-Perfil")
+        if not (pedido and tokenValido(pedido)) and not random.random() < PERFIL_MUESTREO:
+            return None
+        if flask.request.path.startswith("/admin/perfiles"):
+            return None
+        perfil = cProfile.Profile()
+        flask.g.perfil = (perfil, time.perf_counter())
+        perfil.enable()
+        return None
+
+    @app.teardown_request
+    def terminarPerfil(error=None):
+        datos = flask.g.pop("perfil", None)
+        if datos is None:
+            return
+        perfil, inicio = datos
+        perfil.disable()
+        perfil.create_stats()
+        with cerrojo:
+            perfiles.append({
+                "id": next(contador),
+                "metodo": flask.request.method,
+                "ruta": flask.request.path,
+                "endpoint": flask.request.endpoint,
+                "fecha": datetime.datetime.now().isoformat(timespec="seconds"),
+                "duracion_ms": round((time.perf_counter() - inicio) * 1000, 2),
+                "stats": perfil.stats
+            })
+
+    def comprobarAdmin():
+        if not tokenValido(flask.request.headers.get("X-Perfil")):
+            return {"error": "No autorizado"}, 401
+        return None
+
+    @app.route('/admin/perfiles', methods=['GET'])
+    def end_ver_perfiles():
+        """Lista los perfiles guardados"""
+        error = comprobarAdmin()
+        if error:
+            return error
+        with cerrojo:
+            lista = [{k: v for k, v in p.items() if k != "stats"} for p in perfiles]
+        return flask.jsonify(lista)
+
+    @app.route('/admin/perfiles/<int:pid>', methods=['GET'])
+    def end_descargar_perfil(pid):
+        """Descarga un perfil como pstats (por defecto) o pilas colapsadas (?formato=colapsado)"""
+        error = comprobarAdmin()
+        if error:
+            return error
+        with cerrojo:
+            perfil = next((p for p in perfiles if p["id"] == pid), None)
+        if perfil is None:
+            return {"error": "Perfil no encontrado"}, 404
+
+        if flask.request.args.get("formato") == "colapsado":
+            return flask.Response(pilasColapsadas(perfil["stats"]), mimetype="text/plain",
+                headers={"Content-Disposition": f"attachment; filename=perfil_{pid}.txt"})
+
+        # mismo formato que Profile.dump_stats, se abre con pstats.Stats(fichero)
+        return flask.Response(marshal.dumps(perfil["stats"]), mimetype="application/octet-stream",
+            headers={"Content-Disposition": f"attachment; filename=perfil_{pid}.prof"})
+
+    return perfiles
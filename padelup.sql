@@ -98,6 +98,47 @@ CREATE TABLE `Valoraciones` (
   CONSTRAINT `fk_valoraciones_evaluado` FOREIGN KEY (`evaluado`) REFERENCES `Usuarios`(`uid`) ON DELETE RESTRICT ON UPDATE RESTRICT
 ) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4 COLLATE=utf8mb4_0900_ai_ci;
 
+-- Tabla OcupacionHoraria (rollup de Reserva para analitica, ver backend/analitica.py)
+CREATE TABLE `OcupacionHoraria` (
+  `pista` int NOT NULL,               -- referencia a Pistas.pid
+  `hora` datetime NOT NULL,           -- inicio de la franja de una hora
+  `minutos` int NOT NULL DEFAULT 0,   -- minutos ocupados dentro de la franja
+  `reservas` int NOT NULL DEFAULT 0,  -- reservas que empiezan en la franja
+  `ingresos` decimal(10,2) NOT NULL DEFAULT 0.00, -- segun precios por duracion
+  `nivel_A` int NOT NULL DEFAULT 0,   -- reservas por nivel de juego
+  `nivel_B` int NOT NULL DEFAULT 0,
+  `nivel_C` int NOT NULL DEFAULT 0,
+  `nivel_D` int NOT NULL DEFAULT 0,
+  `nivel_F` int NOT NULL DEFAULT 0,
+  PRIMARY KEY (`pista`, `hora`)      -- sin FK: el backfill la recrea con CREATE TABLE ... LIKE
+) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4 COLLATE=utf8mb4_0900_ai_ci;
+
+-- Tabla AnaliticaEstado (rid mas alto agregado en OcupacionHoraria)
+CREATE TABLE `AnaliticaEstado` (
+  `id` int NOT NULL,                  -- siempre 1
+  `ultimo_rid` int NOT NULL DEFAULT 0,
+  `reconstruyendo` boolean NOT NULL DEFAULT 0, -- 1 mientras corre el backfill
+  PRIMARY KEY (`id`)
+) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4 COLLATE=utf8mb4_0900_ai_ci;
+
+INSERT INTO `AnaliticaEstado` (`id`, `ultimo_rid`) VALUES (1, 0);
+
+-- Tabla AnaliticaReservas (reservas ya agregadas en OcupacionHoraria)
+CREATE TABLE `AnaliticaReservas` (
+  `rid` int NOT NULL,                 -- Reserva.rid (sin FK: se borra junto a la reserva)
+  PRIMARY KEY (`rid`)
+) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4 COLLATE=utf8mb4_0900_ai_ci;
+
+-- Tabla AnaliticaBorradas (reservas canceladas mientras corre el backfill)
+CREATE TABLE `AnaliticaBorradas` (
+  `rid` int NOT NULL,                 -- Reserva.rid ya borrada
+  `pista` int NOT NULL,
+  `hora_inicio` datetime NOT NULL,
+  `duracion` int NOT NULL,
+  `nivel_de_juego`  enum('A','B','C','D','F') NOT NULL,
+  PRIMARY KEY (`rid`)
+) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4 COLLATE=utf8mb4_0900_ai_ci;
+
 
 -- ********************************
 -- * Ejemplos de datos (opcional) *